@@ -1,79 +1,169 @@
 #!/usr/bin/env python3
-import argparse
+import atexit
+import getopt
 import json
 import os
 import socket
 import sys
+import tempfile
 
-parser = argparse.ArgumentParser(description="Remote Control for ODR-EDI2EDI")
-parser.add_argument('-s', '--socket', type=str, help='UNIX DGRAM socket path to send to', required=True)
-parser.add_argument('--get', action="store_true", help='Get and display current settings', required=False)
-parser.add_argument('-w', '--delay', type=int, help='Set the delay to the given value in milliseconds', required=False)
-parser.add_argument('-b', '--backoff', type=int, help='Set the backoff to the given value in milliseconds', required=False)
-parser.add_argument('-v', '--verbose', type=int, help='Set verbosity', required=False)
-parser.add_argument('--stats', action="store_true", help='List inputs settings, stats and output stats', required=False)
-parser.add_argument('--live-stats-port', type=int, help='Set live stats UDP port. Use 0 to disable.', required=False)
-parser.add_argument('--reset-counters', action="store_true", help='Reset all statistics counters', required=False)
+USAGE = """usage: remote.py -s SOCKET [options]
 
-parser.add_argument('--enable-input', type=str, help='Enable input specified by hostname:port', required=False)
-parser.add_argument('--disable-input', type=str, help='Disable input specified by hostname:port', required=False)
+Remote Control for ODR-EDI2EDI
 
-cli_args = parser.parse_args()
+  -h, --help                 show this help message and exit
+  -s, --socket SOCKET        UNIX DGRAM socket path to send to
+  --get                      Get and display current settings
+  -w, --delay DELAY          Set the delay to the given value in milliseconds
+  -b, --backoff BACKOFF      Set the backoff to the given value in milliseconds
+  -v, --verbose VERBOSE      Set verbosity
+  --stats                    List inputs settings, stats and output stats
+  --live-stats-port PORT     Set live stats UDP port. Use 0 to disable.
+  --reset-counters           Reset all statistics counters
+  --enable-input INPUT       Enable input specified by hostname:port
+  --disable-input INPUT      Disable input specified by hostname:port
+  --abstract-socket          Receive responses on an abstract UNIX socket instead
+                             of a temporary file (Linux only, needs a converter
+                             newer than v0.9.1)
+"""
+
+# Option name -> (key in cli_args, value converter or None for flags)
+OPTIONS = {
+    '-h': ('help', None), '--help': ('help', None),
+    '-s': ('socket', str), '--socket': ('socket', str),
+    '--get': ('get', None),
+    '-w': ('delay', int), '--delay': ('delay', int),
+    '-b': ('backoff', int), '--backoff': ('backoff', int),
+    '-v': ('verbose', int), '--verbose': ('verbose', int),
+    '--stats': ('stats', None),
+    '--live-stats-port': ('live_stats_port', int),
+    '--reset-counters': ('reset_counters', None),
+    '--enable-input': ('enable_input', str),
+    '--disable-input': ('disable_input', str),
+    '--abstract-socket': ('abstract_socket', None),
+}
+
+# getopt option specifications, derived from OPTIONS
+SHORTOPTS = "".join(opt[1] + (":" if convert else "")
+                    for opt, (_, convert) in OPTIONS.items() if not opt.startswith('--'))
+LONGOPTS = [opt[2:] + ("=" if convert else "")
+            for opt, (_, convert) in OPTIONS.items() if opt.startswith('--')]
+
+def usage_error(message):
+    print(USAGE, end="", file=sys.stderr)
+    print("remote.py: error: {}".format(message), file=sys.stderr)
+    sys.exit(2)
+
+def parse_args(argv):
+    try:
+        opts, args = getopt.gnu_getopt(argv, SHORTOPTS, LONGOPTS)
+    except getopt.GetoptError as e:
+        usage_error(e.msg)
+
+    if args:
+        usage_error("unrecognized arguments: {}".format(" ".join(args)))
+
+    cli_args = {key: None for key, _ in OPTIONS.values()}
+    for opt, value in opts:
+        key, convert = OPTIONS[opt]
+        if key == 'help':
+            print(USAGE, end="")
+            sys.exit(0)
+
+        if convert is None:
+            cli_args[key] = True
+        else:
+            try:
+                cli_args[key] = convert(value)
+            except ValueError:
+                usage_error("argument {}: invalid value: '{}'".format(opt, value))
+
+    if cli_args['socket'] is None:
+        usage_error("the following arguments are required: -s/--socket")
+
+    return cli_args
+
+cli_args = parse_args(sys.argv[1:])
 
 s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+if cli_args['abstract_socket']:
+    if not sys.platform.startswith('linux'):
+        usage_error("argument --abstract-socket: only supported on Linux")
+    # Abstract namespace socket: no filesystem entry to clean up. Converters up to
+    # v0.9.1 pad the reply address with NULs and cannot answer to it.
+    s.bind('\0edi2edi-remote-{}'.format(os.getpid()))
+else:
+    # Private directory per process so that concurrent invocations don't collide
+    MY_SOCK_DIR = tempfile.mkdtemp(prefix='edi2edi-remote-')
+    MY_SOCK_PATH = os.path.join(MY_SOCK_DIR, 'remote')
+
+    def remove_sock_path():
+        try:
+            os.unlink(MY_SOCK_PATH)
+        except FileNotFoundError:
+            pass
+        os.rmdir(MY_SOCK_DIR)
+
+    # Registered before bind() so that the directory is also removed if bind fails
+    atexit.register(remove_sock_path)
+    s.bind(MY_SOCK_PATH)
+
+# Bound both sending and receiving, so that a wedged daemon or a dropped
+# reply doesn't make us hang forever
 s.settimeout(2)
-MY_SOCK_PATH = "/tmp/edi2edi-remote"
-if os.path.exists(MY_SOCK_PATH):
-    os.remove(MY_SOCK_PATH)
-s.bind(MY_SOCK_PATH)
 
-socket_path = cli_args.socket
+socket_path = cli_args['socket']
 
-def send_command(command):
-    s.sendto(command.encode(), socket_path)
-    dat, addr = s.recvfrom(4096)
-    msg = dat.decode()
-    try:
-        # Round-trip through the json library so that it looks nice on console output
-        # and can be reprocessed
-        data = json.loads(msg)
-        print(json.dumps(data, indent=2))
-    except:
-        print("Response is not JSON", file=sys.stderr)
-        print("{}\n".format(msg))
-
-if cli_args.get:
-    print("Current settings:", file=sys.stderr)
-    send_command("get settings")
-
-if cli_args.delay is not None:
-    print("Setting delay to {}".format(cli_args.delay), file=sys.stderr)
-    send_command("set delay {}".format(cli_args.delay))
-
-if cli_args.backoff is not None:
-    print("Setting backoff to {}".format(cli_args.backoff), file=sys.stderr)
-    send_command("set backoff {}".format(cli_args.backoff))
-
-if cli_args.verbose is not None:
-    print("Setting verbose to {}".format(cli_args.verbose), file=sys.stderr)
-    send_command("set verbose {}".format(cli_args.verbose))
-
-if cli_args.stats:
-    print("Stats:", file=sys.stderr)
-    send_command("stats")
-
-if cli_args.enable_input:
-    print("Enabling input {}".format(cli_args.enable_input), file=sys.stderr)
-    send_command("set input enable {}".format(cli_args.enable_input))
-
-if cli_args.disable_input:
-    print("Disable input {}".format(cli_args.disable_input), file=sys.stderr)
-    send_command("set input disable {}".format(cli_args.disable_input))
-
-if cli_args.live_stats_port is not None:
-    print("Set live stats port {}".format(cli_args.live_stats_port), file=sys.stderr)
-    send_command("set live_stats_port {}".format(cli_args.live_stats_port))
-
-if cli_args.reset_counters:
-    print("Resetting counters", file=sys.stderr)
-    send_command("reset counters")
+# Reused for every response to avoid allocating a fresh buffer per command
+_RESP_BUF = bytearray(4096)
+
+def send_commands(commands):
+    """Send all commands back-to-back, then collect the responses in order.
+
+    The daemon answers every datagram with exactly one datagram, in the order
+    it received them, so the requests can be pipelined instead of waiting
+    for a full round-trip per command."""
+    for _, command in commands:
+        s.sendto(command.encode(), socket_path)
+
+    for description, _ in commands:
+        nbytes, addr = s.recvfrom_into(_RESP_BUF)
+        dat = memoryview(_RESP_BUF)[:nbytes].tobytes()
+        print(description, file=sys.stderr)
+        try:
+            # Round-trip through the json library so that it looks nice on console output
+            # and can be reprocessed. json.loads takes the bytes directly.
+            print(json.dumps(json.loads(dat), indent=2))
+        except ValueError:
+            print("Response is not JSON", file=sys.stderr)
+            sys.stdout.flush()
+            sys.stdout.buffer.write(dat)
+            sys.stdout.write("\n\n")
+
+def is_set(value):
+    return value is not None
+
+# cli_args key -> (predicate, message, command) templates, in the order the
+# commands are sent. The option value is substituted for {}. Integer options
+# use is_set because 0 is a valid value; empty strings are ignored.
+COMMANDS = [
+    ('get', bool, "Current settings:", "get settings"),
+    ('delay', is_set, "Setting delay to {}", "set delay {}"),
+    ('backoff', is_set, "Setting backoff to {}", "set backoff {}"),
+    ('verbose', is_set, "Setting verbose to {}", "set verbose {}"),
+    ('stats', bool, "Stats:", "stats"),
+    ('enable_input', bool, "Enabling input {}", "set input enable {}"),
+    ('disable_input', bool, "Disable input {}", "set input disable {}"),
+    ('live_stats_port', is_set, "Set live stats port {}", "set live_stats_port {}"),
+    ('reset_counters', bool, "Resetting counters", "reset counters"),
+]
+
+commands = [(description.format(cli_args[key]), command.format(cli_args[key]))
+            for key, enabled, description, command in COMMANDS
+            if enabled(cli_args[key])]
+
+try:
+    send_commands(commands)
+except socket.timeout:
+    print("daemon unresponsive", file=sys.stderr)
+    sys.exit(2)
@@ -664,7 +664,7 @@ bool Main::handle_rc_request()
         }
 
         ssize_t ret = ::sendto(rc_socket, response.data(), response.size(), 0,
-                (struct sockaddr*)&claddr, sizeof(struct sockaddr_un));
+                (struct sockaddr*)&claddr, claddr_len);
         if (ret == -1) {
             etiLog.level(warn) << "Could not send response to RC: " << strerror(errno);
         }